@@ -1,14 +1,20 @@
-import copy
 import cPickle
+import ctypes
 import os.path as osp
 
 import numpy
 
 from smqtk.algorithms.relevancy_index import RelevancyIndex
-from smqtk.utils.distance_kernel import (
-    compute_distance_matrix
+from smqtk.utils.metrics import (
+    cuda,
+    cuda_available,
+    histogram_intersection_distance_kernel,
+    histogram_intersection_distance_matrix,
+    histogram_intersection_distance_matrix_cuda,
+    histogram_intersection_distance_matrix_uint8,
+    quantize_histograms_uint8,
+    simd_uint8_available,
 )
-from smqtk.utils.metrics import histogram_intersection_distance
 from smqtk.utils.parallel import parallel_map
 
 try:
@@ -22,6 +28,13 @@ except ImportError:
 __author__ = "paul.tunison@kitware.com"
 
 
+# NumPy equivalent of the libSVM ``svm_node`` struct layout (int index, double
+# value, with native alignment padding), used to read support vectors.
+_SVM_NODE_DTYPE = numpy.dtype([('index', numpy.intc),
+                              ('value', numpy.double)],
+                             align=True)
+
+
 class LibSvmHikRelevancyIndex (RelevancyIndex):
     """
     Uses libSVM python interface, using histogram intersection, to implement
@@ -53,7 +66,9 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         return svm and svmutil
 
     def __init__(self, descr_cache_filepath=None, autoneg_select_ratio=1,
-                 multiprocess_fetch=False, cores=None):
+                 multiprocess_fetch=False, cores=None, precompute_kernel=False,
+                 use_gpu=False, gpu_device_id=0, quantize_descriptors=False,
+                 fast_sigmoid=False):
         """
         Initialize a new or existing index.
 
@@ -82,6 +97,45 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
             of None means to use all available cores.
         :type cores: int | None
 
+        :param precompute_kernel: Compute and keep the symmetric distance
+            kernel between all indexed descriptors during ``build_index``.
+            Support vectors that are indexed descriptors then have their
+            distance vectors looked up during ``rank`` instead of recomputed.
+            This kernel takes ``count()**2`` floats of memory, so it should
+            only be enabled for moderately sized indices. Default is False.
+        :type precompute_kernel: bool
+
+        :param use_gpu: Compute distances between support vectors and indexed
+            descriptors on a CUDA device via numba. The indexed descriptor
+            matrix is kept resident on the device. Default is False.
+        :type use_gpu: bool
+
+        :param gpu_device_id: Integer ID of the CUDA device to use. Only used
+            if ``use_gpu`` is True.
+        :type gpu_device_id: int
+
+        :param quantize_descriptors: Also keep indexed descriptors quantized
+            to unsigned bytes, with a single scale mapping the largest indexed
+            value to 255, and compute distances to them during ``rank`` from
+            that, reading a quarter of the memory. Distances are then
+            approximate and exemplar values above the largest indexed value
+            are clipped. With ``precompute_kernel``, distance rows of indexed
+            support vectors still come from the exact kernel, so only those of
+            other support vectors are approximate. Only used when the
+            ``_hik_simd`` C extension was built, as the other uint8 kernels
+            are slower than the single precision ones, and not when
+            ``use_gpu`` is True. Default is False.
+        :type quantize_descriptors: bool
+
+        :param fast_sigmoid: Replace the exponential sigmoid of Platt scaling
+            with the algebraic approximation ``0.5 * (1 - z / (1 + |z|))``.
+            This has the same ordering, but rank values are no longer
+            calibrated probabilities. Whether to flip probabilities is then
+            decided from the average sigmoid input instead of the average
+            probability, which may differ from the exact decision in
+            borderline cases. Default is False.
+        :type fast_sigmoid: bool
+
         """
         super(LibSvmHikRelevancyIndex, self).__init__()
 
@@ -89,6 +143,15 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         self.autoneg_select_ratio = int(autoneg_select_ratio)
         self.multiprocess_fetch = multiprocess_fetch
         self.cores = cores
+        self.precompute_kernel = bool(precompute_kernel)
+        self.use_gpu = bool(use_gpu)
+        self.gpu_device_id = int(gpu_device_id)
+        self.quantize_descriptors = bool(quantize_descriptors)
+        self.fast_sigmoid = bool(fast_sigmoid)
+
+        if self.use_gpu and not cuda_available():
+            raise RuntimeError("GPU use requested but numba CUDA support is "
+                               "not available.")
 
         # Descriptor elements in this index
         self._descr_cache = []
@@ -98,8 +161,16 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         # Mapping of descriptor vectors to their index in the cache, and
         # subsequently in the distance kernel
         self._descr2index = {}
-        # # Distance kernel matrix (symmetric)
-        # self._dist_kernel = None
+        # Distance kernel matrix (symmetric), if precomputed
+        self._dist_kernel = None
+        # CUDA device copy of ``_descr_matrix`` when using the GPU
+        self._d_descr_matrix = None
+        # uint8 quantized ``_descr_matrix`` and its scale, if quantizing
+        self._descr_q8 = None
+        self._descr_q8_scale = None
+        # libSVM node arrays of indexed exemplar vectors given to libSVM in
+        # previous ``rank`` calls, keyed by the vector's raw bytes.
+        self._svm_node_cache = {}
 
         if self.descr_cache_fp and osp.exists(self.descr_cache_fp):
             with open(self.descr_cache_fp, 'rb') as f:
@@ -117,11 +188,53 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         """
         return max(1.0, num_neg/float(num_pos))
 
+    @staticmethod
+    def _platt_probabilities(margins, rho, prob_a, prob_b, fast=False):
+        """
+        Return Platt scaled probabilities for the given vector of decision
+        margins, computed in place in a single output buffer. If ``fast``,
+        ``1 / (1 + exp(z))`` is approximated by ``0.5 * (1 - z / (1 + |z|))``,
+        which is also decreasing in ``z`` and so ranks the same.
+        """
+        probs = numpy.subtract(margins, rho)
+        probs *= prob_a
+        probs += prob_b
+        if fast:
+            denom = numpy.abs(probs)
+            denom += 1.
+            probs /= denom
+            probs *= -0.5
+            probs += 0.5
+            return probs
+        numpy.exp(probs, out=probs)
+        probs += 1.
+        return numpy.reciprocal(probs, out=probs)
+
+    @staticmethod
+    def _needs_flip(pos_margins, margins, pos_probs, probs, prob_a,
+                    fast=False):
+        """
+        Return whether Platt scaled probabilities should be flipped, because
+        the average positive exemplar probability is less than the average
+        index probability.
+
+        With the ``fast`` sigmoid approximation, averages of its values can
+        order differently from averages of the exact sigmoid. The averages of
+        the sigmoid input ``z = (margin - rho) * prob_a + prob_b`` are compared
+        instead, a higher ``z`` meaning a lower probability for both sigmoids.
+        """
+        if not fast:
+            return ((pos_probs.sum() / pos_probs.size) <
+                    (probs.sum() / probs.size))
+        # Mean z difference, with the shared rho and prob_b terms cancelled
+        return prob_a * (pos_margins.mean() - margins.mean()) > 0
+
     @classmethod
     def _gen_svm_parameter_string(cls, num_pos, num_neg):
-        params = copy.copy(cls.SVM_TRAIN_PARAMS)
-        params['-w1'] = cls._gen_w1_weight(num_pos, num_neg)
-        return ' '.join((' '.join((str(k), str(v))) for k, v in params.items()))
+        return '%s -w1 %s' % (
+            ' '.join('%s %s' % p for p in cls.SVM_TRAIN_PARAMS.iteritems()),
+            cls._gen_w1_weight(num_pos, num_neg)
+        )
 
     def get_config(self):
         return {
@@ -129,11 +242,105 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
             'autoneg_select_ratio': self.autoneg_select_ratio,
             'multiprocess_fetch': self.multiprocess_fetch,
             'cores': self.cores,
+            'precompute_kernel': self.precompute_kernel,
+            'use_gpu': self.use_gpu,
+            'gpu_device_id': self.gpu_device_id,
+            'quantize_descriptors': self.quantize_descriptors,
+            'fast_sigmoid': self.fast_sigmoid,
         }
 
     def count(self):
         return len(self._descr_cache)
 
+    def _get_svm_nodes(self, v):
+        """
+        Return descriptor vector ``v`` as a libSVM ``svm_node`` array for
+        training input, reusing the array made in a previous ``rank`` call if
+        the same vector has been seen before (the common IQR refinement case).
+
+        Only vectors of indexed descriptors are pooled, at most one per
+        indexed descriptor, so the pool is bounded by the index size. Arrays
+        for other vectors, e.g. uploaded queries, are made on every call.
+
+        Arrays are filled through a NumPy view of the node struct layout
+        instead of node by node, and have the same dense, zero based indices
+        as ``svm.gen_svm_nodearray`` gives, terminated by a ``-1`` index node.
+        """
+        key = v.tobytes()
+        nodes = self._svm_node_cache.get(key)
+        if nodes is None:
+            nodes = (svm.svm_node * (v.size + 1))()
+            view = numpy.frombuffer(nodes, _SVM_NODE_DTYPE)
+            view['index'][:-1] = numpy.arange(v.size)
+            view['index'][-1] = -1
+            view['value'][:-1] = v.ravel()
+            if (len(self._svm_node_cache) < len(self._descr2index) and
+                    v.astype(numpy.float32).tobytes() in self._descr2index):
+                self._svm_node_cache[key] = nodes
+        return nodes
+
+    @staticmethod
+    def _gen_svm_problem(labels, node_arrays):
+        """
+        Return a libSVM problem over the given training labels and node arrays,
+        equivalent to ``svm.svm_problem(labels, vectors)`` but without
+        converting the vectors to nodes again.
+        """
+        l = len(labels)
+        problem = svm.svm_problem.__new__(svm.svm_problem)
+        problem.l = l
+        # Highest feature index, as computed by ``svm.svm_problem``
+        problem.n = max(len(x) - 2 for x in node_arrays) if l else 0
+        # Keeps the node arrays alive for as long as the problem
+        problem.x_space = node_arrays
+        problem.y = (ctypes.c_double * l)(*labels)
+        problem.x = (ctypes.POINTER(svm.svm_node) * l)(*node_arrays)
+        return problem
+
+    def _index_distances(self, m):
+        """
+        Return the matrix of histogram intersection distances between the rows
+        of ``m`` and our indexed descriptors, using the GPU or the quantized
+        descriptors if configured.
+        """
+        if self._d_descr_matrix is not None:
+            with cuda.gpus[self.gpu_device_id]:
+                return histogram_intersection_distance_matrix_cuda(
+                    m, self._d_descr_matrix
+                )
+        if self._descr_q8 is not None:
+            return histogram_intersection_distance_matrix_uint8(
+                quantize_histograms_uint8(m, self._descr_q8_scale)[0],
+                self._descr_q8, self._descr_q8_scale
+            )
+        return histogram_intersection_distance_matrix(m, self._descr_matrix)
+
+    def _index_distance_rows(self, m):
+        """
+        Return the matrix of histogram intersection distances between the
+        single precision rows of ``m`` and our indexed descriptors, like
+        ``_index_distances``. When the distance kernel is available, rows of
+        ``m`` that are indexed descriptors are copied from it and only the
+        remaining rows have their distances computed. The kernel is exact, so
+        when descriptors are quantized only the computed rows are approximate.
+        """
+        if self._dist_kernel is None:
+            return self._index_distances(m)
+        k = numpy.empty((m.shape[0], self._dist_kernel.shape[1]),
+                        dtype=self._dist_kernel.dtype)
+        novel = []
+        for i in xrange(m.shape[0]):
+            idx = self._descr2index.get(m[i].tobytes())
+            if idx is None:
+                novel.append(i)
+            else:
+                k[i] = self._dist_kernel[idx]
+        self._log.debug("Computing distances for %d of %d vectors",
+                        len(novel), m.shape[0])
+        if novel:
+            k[novel] = self._index_distances(m[novel])
+        return k
+
     def build_index(self, descriptors):
         """
         Build the index based on the given iterable of descriptor elements.
@@ -152,7 +359,8 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         # and subsequently in the distance kernel.
         self._descr2index = {}
         # matrix for creating distance kernel
-        self._descr_matrix = []
+        self._descr_matrix = None
+        self._svm_node_cache = {}
 
         def get_vector(d):
             return d, d.vector()
@@ -163,17 +371,68 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
                                    cores=self.cores,
                                    ordered=True)
 
-        for i, (d, v) in enumerate(vector_iter):
+        # Vectors are written straight into a single precision, C-contiguous
+        # matrix, which halves the memory traffic of the distance computations
+        # in ``rank``. When the number of descriptors is known up front the
+        # matrix is allocated once, otherwise its capacity is doubled as
+        # needed and trimmed at the end.
+        try:
+            capacity = len(descriptors)
+        except TypeError:
+            capacity = 1024
+        m = None
+        n = 0
+        for d, v in vector_iter:
+            if m is None:
+                m = numpy.empty((max(capacity, 1), v.size), dtype=numpy.float32)
+            elif n == m.shape[0]:
+                m_grown = numpy.empty((m.shape[0] * 2, m.shape[1]),
+                                      dtype=m.dtype)
+                m_grown[:n] = m
+                m = m_grown
+            m[n] = v
             self._descr_cache.append(d)
-            self._descr_matrix.append(v)
-            self._descr2index[tuple(v)] = i
-        self._descr_matrix = numpy.array(self._descr_matrix)
-
-        # TODO: (?) For when we optimize SVM SV kernel computation
-        # self._dist_kernel = \
-        #    compute_distance_kernel(self._descr_matrix,
-        #                            histogram_intersection_distance2,
-        #                            row_wise=True)
+            # Keyed on the raw bytes of the single precision value we store
+            # and compare support vectors against.
+            self._descr2index[m[n].tobytes()] = n
+            n += 1
+        if m is None:
+            m = numpy.empty((0, 0), dtype=numpy.float32)
+        elif n < m.shape[0]:
+            m = m[:n].copy()
+        self._descr_matrix = m
+
+        self._d_descr_matrix = None
+        if self.use_gpu and n:
+            self._log.debug("Transferring descriptor matrix to GPU")
+            with cuda.gpus[self.gpu_device_id]:
+                self._d_descr_matrix = cuda.to_device(self._descr_matrix)
+
+        self._descr_q8 = self._descr_q8_scale = None
+        if self.quantize_descriptors and not self.use_gpu and n:
+            if not simd_uint8_available():
+                self._log.warning("Descriptor quantization requested but the "
+                                  "_hik_simd extension is not built. Using "
+                                  "single precision distances.")
+            else:
+                self._log.debug("Quantizing descriptor matrix")
+                self._descr_q8, self._descr_q8_scale = \
+                    quantize_histograms_uint8(self._descr_matrix)
+
+        self._dist_kernel = None
+        if self.precompute_kernel:
+            self._log.debug("Computing descriptor distance kernel")
+            if self._d_descr_matrix is not None:
+                # Both operands already resident on the device
+                with cuda.gpus[self.gpu_device_id]:
+                    self._dist_kernel = \
+                        histogram_intersection_distance_matrix_cuda(
+                            self._d_descr_matrix, self._d_descr_matrix
+                        )
+            else:
+                # Symmetric, so only one triangle needs computing
+                self._dist_kernel = \
+                    histogram_intersection_distance_kernel(self._descr_matrix)
 
         if self.descr_cache_fp:
             with open(self.descr_cache_fp, 'wb') as f:
@@ -197,6 +456,36 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
             meaning least relevant.
         :rtype: dict[smqtk.representation.DescriptorElement, float]
 
+        """
+        elements, probs = self.rank_arrays(pos, neg)
+        return dict(zip(elements, probs.tolist()))
+
+    def rank_arrays(self, pos, neg, top_k=None):
+        """
+        Rank the currently indexed elements given ``pos`` positive and ``neg``
+        negative exemplar descriptor elements, like ``rank``, but return the
+        ranked elements and their rank values as parallel sequences instead of
+        building a map. This avoids creating a dictionary and a float object
+        per indexed element when the caller only sorts or thresholds results.
+
+        :param pos: Iterable of positive exemplar DescriptorElement instances.
+        :type pos: collections.Iterable[smqtk.representation.DescriptorElement]
+
+        :param neg: Iterable of negative exemplar DescriptorElement instances.
+        :type neg: collections.Iterable[smqtk.representation.DescriptorElement]
+
+        :param top_k: If given, only return the ``top_k`` most relevant
+            elements, in order of decreasing relevancy. Otherwise all indexed
+            elements are returned in index order.
+        :type top_k: None | int
+
+        :return: Sequence of indexed descriptor elements and the parallel
+            array of their rank values in the [0, 1] range. When ``top_k`` is
+            not given the element sequence is the index's own, and should not
+            be modified.
+        :rtype: (list[smqtk.representation.DescriptorElement],
+                 numpy.core.multiarray.ndarray)
+
         """
         # Notes:
         # - Pos and neg exemplars may be in our index.
@@ -210,24 +499,30 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         # Creating training matrix and labels
         train_labels = []
         train_vectors = []
+        train_nodes = []
         num_pos = 0
         for d in pos:
             train_labels.append(+1)
-            train_vectors.append(d.vector().tolist())
+            train_vectors.append(d.vector())
+            train_nodes.append(self._get_svm_nodes(train_vectors[-1]))
             num_pos += 1
         self._log.debug("Positives given: %d", num_pos)
 
         # When no negative examples are given, naively pick most distant example
         # in our dataset, using HI metric, for each positive example
+        # - Skipped without positives, which is reported below.
         neg_autoselect = set()
-        if not neg:
+        if not neg and num_pos:
             self._log.info("Auto-selecting negative examples. (%d per positive)",
                            self.autoneg_select_ratio)
             # ``train_vectors`` only composed of positive examples at this point
-            for p in pos:
-                # where d is the distance vector to descriptor elements in cache
-                d = histogram_intersection_distance(p.vector(),
-                                                    self._descr_matrix)
+            # Distances of all positives to the descriptor elements in cache,
+            # looked up from the distance kernel for indexed positives and
+            # computed in one pass over the cache for the rest.
+            pos_dists = self._index_distance_rows(
+                numpy.array(train_vectors, dtype=numpy.float32)
+            )
+            for d in pos_dists:
                 # Scan vector for max distance index
                 # - Allow variable number of maximally distance descriptors to
                 #   be picked per positive.
@@ -250,11 +545,13 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         num_neg = 0
         for d in neg:
             train_labels.append(-1)
-            train_vectors.append(d.vector().tolist())
+            train_vectors.append(d.vector())
+            train_nodes.append(self._get_svm_nodes(train_vectors[-1]))
             num_neg += 1
         for d in neg_autoselect:
             train_labels.append(-1)
-            train_vectors.append(d.vector().tolist())
+            train_vectors.append(d.vector())
+            train_nodes.append(self._get_svm_nodes(train_vectors[-1]))
             num_neg += 1
 
         if not num_pos:
@@ -264,7 +561,7 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
 
         # Training SVM model
         self._log.debug("online model training")
-        svm_problem = svm.svm_problem(train_labels, train_vectors)
+        svm_problem = self._gen_svm_problem(train_labels, train_nodes)
         svm_model = svmutil.svm_train(svm_problem,
                                       self._gen_svm_parameter_string(num_pos,
                                                                      num_neg))
@@ -280,34 +577,34 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         # Q: is this always the same as ``svm_model.l``?
         num_SVs = sum(svm_model.nSV[:svm_model.nr_class])
         # Support vector dimensionality
-        dim_SVs = len(train_vectors[0])
+        dim_SVs = train_vectors[0].size
         # initialize matrix they're going into
-        svm_SVs = numpy.ndarray((num_SVs, dim_SVs), dtype=float)
+        svm_SVs = numpy.ndarray((num_SVs, dim_SVs), dtype=numpy.float32)
+        # - Copy each SV's node array out of libSVM memory in one go and take
+        #   the value field, instead of visiting each node through ctypes.
+        sv_nbytes = dim_SVs * _SVM_NODE_DTYPE.itemsize
         for i, nlist in enumerate(svm_model.SV[:svm_SVs.shape[0]]):
-            svm_SVs[i, :] = [n.value for n in nlist[:len(train_vectors[0])]]
+            nodes = ctypes.string_at(ctypes.addressof(nlist.contents),
+                                     sv_nbytes)
+            svm_SVs[i, :] = numpy.frombuffer(nodes, _SVM_NODE_DTYPE)['value']
         # compute matrix of distances from support vectors to index elements
-        # TODO: Optimize this step by caching SV distance vectors
-        #       - It is known that SVs are vectors from the training data, so
-        #           if the same descriptors are given to this function
-        #           repeatedly (which is the case for IQR), this can be faster
-        #           because we're only computing at most a few more distance
-        #           vectors against our indexed descriptor matrix, and the rest
-        #           have already been computed before.
-        #       - At worst, we're effectively doing this call because each SV
-        #           needs to have its distance vector computed.
-        svm_test_k = compute_distance_matrix(svm_SVs, self._descr_matrix,
-                                             histogram_intersection_distance,
-                                             row_wise=True)
+        # - SVs are vectors from the training data, which in IQR are often
+        #   descriptors in our index.
+        svm_test_k = self._index_distance_rows(svm_SVs)
 
         self._log.debug("Platt scaling")
         # the actual platt scaling stuff
-        weights = numpy.array(svm_model.get_sv_coef()).flatten()
+        # - weights are matched to the distance matrix dtype so that the
+        #   product is a single BLAS gemv without up-casting the matrix.
+        weights = numpy.array(svm_model.get_sv_coef(),
+                              dtype=svm_test_k.dtype).flatten()
         margins = numpy.dot(weights, svm_test_k)
         rho = svm_model.rho[0]
         probA = svm_model.probA[0]
         probB = svm_model.probB[0]
         #: :type: numpy.core.multiarray.ndarray
-        probs = 1.0 / (1.0 + numpy.exp((margins - rho) * probA + probB))
+        probs = self._platt_probabilities(margins, rho, probA, probB,
+                                          self.fast_sigmoid)
 
         # Detect whether we need to flip probabilities
         # - Probability of input positive examples should have a high
@@ -317,21 +614,28 @@ class LibSvmHikRelevancyIndex (RelevancyIndex):
         #   that the SVM will change which index it uses to represent a
         #   particular class label occasionally, which influences the Platt
         #   scaling apparently.
-        pos_vectors = numpy.array(train_vectors[:num_pos])
-        pos_test_k = compute_distance_matrix(svm_SVs, pos_vectors,
-                                             histogram_intersection_distance,
-                                             row_wise=True)
+        pos_vectors = numpy.array(train_vectors[:num_pos], dtype=numpy.float32)
+        pos_test_k = histogram_intersection_distance_matrix(svm_SVs,
+                                                            pos_vectors)
         pos_margins = numpy.dot(weights, pos_test_k)
         #: :type: numpy.core.multiarray.ndarray
-        pos_probs = 1.0 / (1.0 + numpy.exp((pos_margins - rho) * probA + probB))
+        pos_probs = self._platt_probabilities(pos_margins, rho, probA, probB,
+                                              self.fast_sigmoid)
         # Check if average positive probability is less than the average index
         # probability. If so, the platt scaling probably needs to be flipped.
-        if (pos_probs.sum() / pos_probs.size) < (probs.sum() / probs.size):
+        if self._needs_flip(pos_margins, margins, pos_probs, probs, probA,
+                            self.fast_sigmoid):
             self._log.debug("inverting probabilities")
             probs = 1. - probs
 
-        rank_pool = dict(zip(self._descr_cache, probs))
-        return rank_pool
+        if top_k is None:
+            return self._descr_cache, probs
+        top_k = min(max(int(top_k), 0), probs.size)
+        if top_k == 0:
+            return [], probs[:0]
+        top = numpy.argpartition(probs, probs.size - top_k)[-top_k:]
+        top = top[numpy.argsort(probs[top])[::-1]]
+        return [self._descr_cache[i] for i in top], probs[top]
 
 
 RELEVANCY_INDEX_CLASS = LibSvmHikRelevancyIndex
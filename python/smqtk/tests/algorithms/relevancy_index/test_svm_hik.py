@@ -1,11 +1,15 @@
+import ctypes
 import unittest
 
+import mock
 import nose.tools as ntools
 import numpy as np
 
 from smqtk.representation.descriptor_element.local_elements import \
     DescriptorMemoryElement
+from smqtk.algorithms.relevancy_index import libsvm_hik
 from smqtk.algorithms.relevancy_index.libsvm_hik import LibSvmHikRelevancyIndex
+from smqtk.utils.metrics import cuda_available
 
 
 __author__ = "paul.tunison@kitware.com"
@@ -54,6 +58,106 @@ if LibSvmHikRelevancyIndex.is_usable():
             # test config idempotency
             ntools.assert_dict_equal(c, iqr_index.get_config())
 
+        def test_svm_node_dtype(self):
+            # Struct layout used when reading SVs must match libSVM's
+            ntools.assert_equal(libsvm_hik._SVM_NODE_DTYPE.itemsize,
+                                ctypes.sizeof(libsvm_hik.svm.svm_node))
+            ntools.assert_equal(libsvm_hik._SVM_NODE_DTYPE.fields['value'][1],
+                                libsvm_hik.svm.svm_node.value.offset)
+
+        def test_svm_problem(self):
+            # Problem built from pooled node arrays should match libSVM's own
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            vectors = [self.q_pos.vector(), self.d5.vector()]
+            nodes = [iqr_index._get_svm_nodes(v) for v in vectors]
+            # Only the indexed vector is pooled
+            ntools.assert_is(iqr_index._get_svm_nodes(vectors[1].copy()),
+                             nodes[1])
+            ntools.assert_is_not(iqr_index._get_svm_nodes(vectors[0]),
+                                 nodes[0])
+            ntools.assert_equal(len(iqr_index._svm_node_cache), 1)
+            p = LibSvmHikRelevancyIndex._gen_svm_problem([1, -1], nodes)
+            p_expected = libsvm_hik.svm.svm_problem(
+                [1, -1], [v.tolist() for v in vectors]
+            )
+            ntools.assert_equal(p.l, p_expected.l)
+            ntools.assert_equal(p.n, p_expected.n)
+            ntools.assert_equal(p.y[:2], p_expected.y[:2])
+            for i in range(2):
+                ntools.assert_equal(
+                    [(p.x[i][j].index, p.x[i][j].value) for j in range(6)],
+                    [(p_expected.x[i][j].index, p_expected.x[i][j].value)
+                     for j in range(6)]
+                )
+
+        def test_svm_parameter_string(self):
+            p = LibSvmHikRelevancyIndex._gen_svm_parameter_string(2, 6)
+            ntools.assert_true(p.endswith(' -w1 3.0'))
+            for k, v in LibSvmHikRelevancyIndex.SVM_TRAIN_PARAMS.items():
+                ntools.assert_in('%s %s' % (k, v), p)
+
+        def test_platt_probabilities_fast(self):
+            margins = np.linspace(-3, 3, 61)
+            probs = LibSvmHikRelevancyIndex._platt_probabilities(
+                margins, 0.5, -2., 0.1
+            )
+            probs_fast = LibSvmHikRelevancyIndex._platt_probabilities(
+                margins, 0.5, -2., 0.1, fast=True
+            )
+            # Same ordering and midpoint, within (0, 1)
+            np.testing.assert_array_equal(np.argsort(probs_fast),
+                                          np.argsort(probs))
+            ntools.assert_true(((probs_fast > 0) & (probs_fast < 1)).all())
+            z0 = np.argmin(np.abs((margins - 0.5) * -2. + 0.1))
+            ntools.assert_almost_equal(probs_fast[z0], probs[z0], places=1)
+
+        def test_needs_flip(self):
+            # Exact sigmoid decision is on average probabilities, where a
+            # single weak positive must not cause a flip.
+            pos_probs = np.array([0.454, 0.750])
+            probs = np.array([0.40, 0.51, 0.63])
+            ntools.assert_false(LibSvmHikRelevancyIndex._needs_flip(
+                None, None, pos_probs, probs, 1.
+            ))
+            ntools.assert_true(LibSvmHikRelevancyIndex._needs_flip(
+                None, None, pos_probs[:1], probs, 1.
+            ))
+
+        def test_needs_flip_fast_sigmoid(self):
+            # Margins where the averages of the exact and fast sigmoid values
+            # order differently. The exact decision is not to flip, which the
+            # fast decision must match.
+            platt = LibSvmHikRelevancyIndex._platt_probabilities
+            pos_margins = np.array([-10., 2.])
+            margins = np.array([-0.2])
+            ntools.assert_false(LibSvmHikRelevancyIndex._needs_flip(
+                pos_margins, margins, platt(pos_margins, 0., 1., 0.),
+                platt(margins, 0., 1., 0.), 1.
+            ))
+            pos_fast = platt(pos_margins, 0., 1., 0., fast=True)
+            fast = platt(margins, 0., 1., 0., fast=True)
+            ntools.assert_less(pos_fast.mean(), fast.mean())
+            ntools.assert_false(LibSvmHikRelevancyIndex._needs_flip(
+                pos_margins, margins, pos_fast, fast, 1., fast=True
+            ))
+            # Flipped sign of probA flips the decision
+            ntools.assert_true(LibSvmHikRelevancyIndex._needs_flip(
+                pos_margins, margins, None, None, -1., fast=True
+            ))
+
+        def test_rank_fast_sigmoid(self):
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_f = LibSvmHikRelevancyIndex(fast_sigmoid=True)
+            iqr_index_f.build_index(self.index_descriptors)
+            rank = iqr_index.rank([self.q_pos], [self.q_neg])
+            rank_f = iqr_index_f.rank([self.q_pos], [self.q_neg])
+            ntools.assert_equal(
+                sorted(self.index_descriptors, key=rank.get),
+                sorted(self.index_descriptors, key=rank_f.get)
+            )
+
         def test_rank_no_neg(self):
             iqr_index = LibSvmHikRelevancyIndex()
             iqr_index.build_index(self.index_descriptors)
@@ -69,7 +173,8 @@ if LibSvmHikRelevancyIndex.is_usable():
         def test_rank_no_input(self):
             iqr_index = LibSvmHikRelevancyIndex()
             iqr_index.build_index(self.index_descriptors)
-            ntools.assert_raises(ValueError, iqr_index.rank, [], [])
+            ntools.assert_raises_regexp(ValueError, "No positive examples",
+                                        iqr_index.rank, [], [])
 
         def test_count(self):
             iqr_index = LibSvmHikRelevancyIndex()
@@ -77,6 +182,18 @@ if LibSvmHikRelevancyIndex.is_usable():
             iqr_index.build_index(self.index_descriptors)
             ntools.assert_equal(iqr_index.count(), 7)
 
+        def test_build_index_iterable(self):
+            # Index built from an iterable of unknown length should match one
+            # built from a sequence.
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_iter = LibSvmHikRelevancyIndex()
+            iqr_index_iter.build_index(iter(self.index_descriptors))
+            ntools.assert_equal(iqr_index_iter.count(), 7)
+            ntools.assert_equal(iqr_index_iter._descr_matrix.shape, (7, 5))
+            np.testing.assert_array_equal(iqr_index_iter._descr_matrix,
+                                          iqr_index._descr_matrix)
+
         def test_simple_iqr_scenario(self):
             # Make some descriptors;
             # Pick some from created set that are close to each other and use as
@@ -102,3 +219,83 @@ if LibSvmHikRelevancyIndex.is_usable():
             ntools.assert_equal(rank_ordered[4][0], self.d6)
             ntools.assert_equal(rank_ordered[5][0], self.d3)
             ntools.assert_equal(rank_ordered[6][0], self.d4)
+
+        def test_rank_arrays(self):
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            rank = iqr_index.rank([self.q_pos], [self.q_neg])
+
+            elements, probs = iqr_index.rank_arrays([self.q_pos], [self.q_neg])
+            ntools.assert_equal(list(elements), self.index_descriptors)
+            for d, p in zip(elements, probs):
+                ntools.assert_almost_equal(rank[d], p)
+
+            expected = sorted(rank.values(), reverse=True)
+            for k in (0, 3, 7, 10):
+                elements, probs = iqr_index.rank_arrays([self.q_pos],
+                                                        [self.q_neg], top_k=k)
+                ntools.assert_equal(len(elements), min(k, 7))
+                np.testing.assert_allclose(probs, expected[:k])
+                np.testing.assert_allclose([rank[d] for d in elements], probs)
+
+        def test_rank_precomputed_kernel(self):
+            # Ranking with indexed exemplars should be the same whether SV
+            # distances come from the precomputed kernel or are computed.
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_k = LibSvmHikRelevancyIndex(precompute_kernel=True)
+            iqr_index_k.build_index(self.index_descriptors)
+            ntools.assert_equal(iqr_index_k._dist_kernel.shape, (7, 7))
+            for i, d in enumerate(self.index_descriptors):
+                key = d.vector().astype(np.float32).tobytes()
+                ntools.assert_equal(iqr_index_k._descr2index[key], i)
+
+            # Including auto-selected negatives for indexed and novel positives
+            for pos, neg in (([self.d0, self.d5], [self.d4]),
+                             ([self.q_pos, self.d5], [self.q_neg, self.d3]),
+                             ([self.d0, self.d5], []),
+                             ([self.q_pos], [])):
+                rank = iqr_index.rank(pos, neg)
+                rank_k = iqr_index_k.rank(pos, neg)
+                for d in self.index_descriptors:
+                    ntools.assert_almost_equal(rank[d], rank_k[d], places=5)
+
+        def test_rank_quantized(self):
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_q = LibSvmHikRelevancyIndex(quantize_descriptors=True)
+            # Falls back to single precision without the SIMD extension
+            with mock.patch.object(libsvm_hik, 'simd_uint8_available',
+                                   return_value=False):
+                iqr_index_q.build_index(self.index_descriptors)
+            ntools.assert_is_none(iqr_index_q._descr_q8)
+            iqr_index_q.build_index(self.index_descriptors)
+            if libsvm_hik.simd_uint8_available():
+                ntools.assert_equal(iqr_index_q._descr_q8.dtype, np.uint8)
+
+            rank = iqr_index.rank([self.q_pos], [self.q_neg])
+            rank_q = iqr_index_q.rank([self.q_pos], [self.q_neg])
+            for d in self.index_descriptors:
+                ntools.assert_almost_equal(rank[d], rank_q[d], places=2)
+
+        @unittest.skipIf(not cuda_available(), "CUDA not available")
+        def test_rank_gpu(self):
+            iqr_index = LibSvmHikRelevancyIndex()
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_gpu = LibSvmHikRelevancyIndex(use_gpu=True)
+            iqr_index_gpu.build_index(self.index_descriptors)
+
+            rank = iqr_index.rank([self.q_pos], [self.q_neg])
+            rank_gpu = iqr_index_gpu.rank([self.q_pos], [self.q_neg])
+            for d in self.index_descriptors:
+                ntools.assert_almost_equal(rank[d], rank_gpu[d], places=5)
+
+        @unittest.skipIf(not cuda_available(), "CUDA not available")
+        def test_build_index_gpu_kernel(self):
+            iqr_index = LibSvmHikRelevancyIndex(precompute_kernel=True)
+            iqr_index.build_index(self.index_descriptors)
+            iqr_index_gpu = LibSvmHikRelevancyIndex(precompute_kernel=True,
+                                                    use_gpu=True)
+            iqr_index_gpu.build_index(self.index_descriptors)
+            np.testing.assert_allclose(iqr_index_gpu._dist_kernel,
+                                       iqr_index._dist_kernel, atol=1e-6)
@@ -1,6 +1,7 @@
 import random
 import unittest
 
+import mock
 import nose.tools as ntools
 import numpy as np
 
@@ -84,6 +85,141 @@ class TestHistogramIntersectionDistance (unittest.TestCase):
         ntools.assert_raises(ValueError, df.histogram_intersection_distance,
                              self.m1, self.m2)
 
+    def test_hi_matrix(self):
+        expected = np.array([df.histogram_intersection_distance(r, self.m1)
+                             for r in self.m2])
+        np.testing.assert_allclose(
+            df.histogram_intersection_distance_matrix(self.m2, self.m1),
+            expected
+        )
+        # Broadcast fallback, where block size should not change the result
+        with mock.patch.object(df, '_hik_matrix_numba', None), \
+                mock.patch.object(df, '_hik_matrix_simd', None):
+            for bs in (1, 64):
+                np.testing.assert_allclose(
+                    df.histogram_intersection_distance_matrix(self.m2,
+                                                              self.m1,
+                                                              block_size=bs),
+                    expected
+                )
+        # 1D input treated as a single row
+        np.testing.assert_allclose(
+            df.histogram_intersection_distance_matrix(self.v2, self.m1),
+            [[0., 1., 0.5]]
+        )
+
+        ntools.assert_raises(ValueError,
+                             df.histogram_intersection_distance_matrix,
+                             self.m1, np.array([[1, 0, 0]]))
+
+    def test_hi_matrix_blocked(self):
+        # Broadcast fallback with memory budgets splitting both a and b
+        a = np.random.rand(13, 32)
+        b = np.random.rand(29, 32)
+        expected = [df.histogram_intersection_distance(r, b) for r in a]
+        with mock.patch.object(df, '_hik_matrix_numba', None), \
+                mock.patch.object(df, '_hik_matrix_simd', None):
+            # Whole matrix, several rows of a, one row of a and part of b
+            for budget in (2**20, 8 * 32 * 29 * 4, 8 * 32 * 5, 1):
+                with mock.patch.object(df, 'HIK_BLOCK_BYTES', budget):
+                    np.testing.assert_allclose(
+                        df.histogram_intersection_distance_matrix(a, b),
+                        expected
+                    )
+
+    @unittest.skipIf(df.numba is None, "numba not available")
+    def test_hi_matrix_numba(self):
+        a = np.random.rand(13, 32)
+        a /= a.sum(1)[:, np.newaxis]
+        b = np.random.rand(29, 32)
+        b /= b.sum(1)[:, np.newaxis]
+        expected = [df.histogram_intersection_distance(r, b) for r in a]
+        # Tiles that both do and do not evenly divide the output
+        for tile_a, tile_b in ((1, 1), (4, 7), (13, 29), (20, 40)):
+            k = np.empty((13, 29))
+            df._hik_matrix_numba(a, b, k, tile_a, tile_b)
+            np.testing.assert_allclose(k, expected)
+
+    @unittest.skipIf(df._hik_matrix_simd is None,
+                     "_hik_simd extension not built")
+    def test_hi_matrix_simd(self):
+        # Dimensions around and between the SIMD lane widths
+        for dim in (1, 7, 8, 16, 33):
+            a = np.random.rand(13, dim).astype(np.float32)
+            a /= a.sum(1)[:, np.newaxis]
+            b = np.random.rand(29, dim).astype(np.float32)
+            b /= b.sum(1)[:, np.newaxis]
+            k = np.empty((13, 29), np.float32)
+            df._hik_matrix_simd(a, b, k)
+            np.testing.assert_allclose(
+                k, [df.histogram_intersection_distance(r, b) for r in a],
+                rtol=1e-5, atol=1e-6
+            )
+
+        ntools.assert_raises(ValueError, df._hik_matrix_simd,
+                             a.astype(float), b, k)
+        ntools.assert_raises(ValueError, df._hik_matrix_simd,
+                             a, b, np.empty((13, 28), np.float32))
+
+    def test_hi_kernel(self):
+        m = np.random.rand(37, 16)
+        expected = [df.histogram_intersection_distance(r, m) for r in m]
+        np.testing.assert_allclose(df.histogram_intersection_distance_kernel(m),
+                                   expected)
+        # Tiles that do and do not evenly divide the rows
+        if df._hik_kernel_numba is not None:
+            for tile in (1, 5, 37, 64):
+                k = np.empty((37, 37))
+                df._hik_kernel_numba(m, k, tile)
+                np.testing.assert_allclose(k, expected)
+        # Blocked fallback, with blocks that do not evenly divide the rows
+        with mock.patch.object(df, '_hik_kernel_numba', None):
+            for bs in (1, 5, 37, 64):
+                np.testing.assert_allclose(
+                    df.histogram_intersection_distance_kernel(m, bs), expected
+                )
+
+    def test_hi_matrix_uint8(self):
+        a = np.random.rand(13, 33)
+        a /= a.sum(1)[:, np.newaxis]
+        b = np.random.rand(29, 33)
+        b /= b.sum(1)[:, np.newaxis]
+        b_q, scale = df.quantize_histograms_uint8(b)
+        ntools.assert_equal(b_q.dtype, np.uint8)
+        ntools.assert_equal(b_q.max(), 255)
+        a_q = df.quantize_histograms_uint8(a, scale)[0]
+        expected = 1. - np.minimum(a_q[:, np.newaxis].astype(float),
+                                   b_q[np.newaxis]).sum(2) / scale
+        k = df.histogram_intersection_distance_matrix_uint8(a_q, b_q, scale)
+        ntools.assert_equal(k.dtype, np.float32)
+        np.testing.assert_allclose(k, expected, rtol=1e-5)
+        with mock.patch.object(df, '_hik_matrix_u8_simd', None):
+            np.testing.assert_allclose(
+                df.histogram_intersection_distance_matrix_uint8(a_q, b_q,
+                                                                scale, 5),
+                expected, rtol=1e-5
+            )
+        # Approximates the distance of the original histograms
+        np.testing.assert_allclose(
+            k, df.histogram_intersection_distance_matrix(a, b),
+            atol=a.shape[1] / scale
+        )
+        ntools.assert_raises(ValueError,
+                             df.histogram_intersection_distance_matrix_uint8,
+                             a, b_q, scale)
+
+    @unittest.skipIf(not df.cuda_available(), "CUDA not available")
+    def test_hi_matrix_cuda(self):
+        a = np.random.rand(13, 32).astype(np.float32)
+        a /= a.sum(1)[:, np.newaxis]
+        b = np.random.rand(29, 32).astype(np.float32)
+        b /= b.sum(1)[:, np.newaxis]
+        np.testing.assert_allclose(
+            df.histogram_intersection_distance_matrix_cuda(a, b),
+            df.histogram_intersection_distance_matrix(a, b),
+            rtol=1e-5, atol=1e-6
+        )
+
 
 class TestHammingDistance (unittest.TestCase):
 
@@ -10,6 +10,29 @@ Kitware, Inc., 28 Corporate Drive, Clifton Park, NY 12065.
 from math import log, ceil, acos, pi
 import numpy as np
 
+try:
+    import numba
+    from numba import cuda
+except (ImportError, TypeError):
+    numba = None
+    cuda = None
+
+try:
+    from ._hik_simd import hik_matrix as _hik_matrix_simd
+    from ._hik_simd import hik_matrix_u8 as _hik_matrix_u8_simd
+except ImportError:
+    _hik_matrix_simd = None
+    _hik_matrix_u8_simd = None
+
+
+# Target number of bytes of input rows the numba histogram intersection
+# kernel keeps in cache per output tile (about half of a typical L2 cache).
+HIK_TILE_BYTES = 256 * 1024
+
+# Target size in bytes of the temporary ``minimum`` array of the NumPy
+# histogram intersection fallbacks, per broadcast pass.
+HIK_BLOCK_BYTES = 32 * 1024 * 1024
+
 
 def histogram_intersection_distance(a, b):
     """
@@ -83,6 +106,348 @@ def histogram_intersection_distance_fast(i, j):
     return 1.0 - ((i + j - np.abs(i - j)).sum() * 0.5)
 
 
+def histogram_intersection_distance_matrix(a, b, block_size=64):
+    """
+    Compute the pair-wise histogram intersection distance matrix between the
+    rows of ``a`` and the rows of ``b``.
+
+    This is equivalent to calling ``histogram_intersection_distance`` with
+    each row of ``a`` against the whole of ``b``, but pushes the loop over rows
+    of ``a`` into compiled code.
+
+    When numba is available, a parallel JIT kernel is used that walks the
+    output in 2D tiles sized so that the rows of ``a`` and ``b`` of a tile fit
+    in about ``HIK_TILE_BYTES`` of cache, reusing each cached row of ``b``
+    across all rows of ``a`` in the tile. Otherwise, if both inputs are
+    float32 and the optional ``_hik_simd`` C extension was built, its AVX /
+    AVX-512 kernel is used. Failing both, a broadcast ``minimum``/``sum``
+    expression is evaluated over blocks of at most ``block_size`` rows of
+    ``a`` and as many rows of ``b`` as keep the temporary array within about
+    ``HIK_BLOCK_BYTES``, so that memory use stays bounded for large ``b``.
+
+    :param a: Histogram or matrix of histograms ``a``
+    :type a: numpy.core.multiarray.ndarray
+
+    :param b: Histogram or matrix of histograms ``b``
+    :type b: numpy.core.multiarray.ndarray
+
+    :param block_size: Maximum number of rows of ``a`` to process per
+        broadcast pass when neither compiled kernel is available.
+    :type block_size: int
+
+    :return: Matrix of distances of shape ``(len(a), len(b))``, where element
+        ``[i, j]`` is the distance between ``a[i]`` and ``b[j]``.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    a = np.atleast_2d(a)
+    b = np.atleast_2d(b)
+    if a.shape[1] != b.shape[1]:
+        raise ValueError("Input histograms must be of the same dimensionality "
+                         "(%d != %d)" % (a.shape[1], b.shape[1]))
+    k = np.empty((a.shape[0], b.shape[0]),
+                 dtype=np.result_type(a.dtype, b.dtype, np.float32))
+    if _hik_matrix_numba is not None:
+        # Rows of a and b (in that order) fitting in a cache tile
+        row_bytes = a.shape[1] * max(a.itemsize, b.itemsize)
+        tile_rows = max(2, HIK_TILE_BYTES // max(1, row_bytes))
+        tile_a = max(1, min(a.shape[0], tile_rows // 2))
+        tile_b = max(1, tile_rows - tile_a)
+        _hik_matrix_numba(a, b, k, tile_a, tile_b)
+        return k
+    if (_hik_matrix_simd is not None and
+            a.dtype == np.float32 and b.dtype == np.float32):
+        _hik_matrix_simd(np.ascontiguousarray(a), np.ascontiguousarray(b), k)
+        return k
+    _hik_sums_blocked(a, b, k, block_size)
+    return np.subtract(1., k, out=k)
+
+
+def _hik_sums_blocked(a, b, out, block_size, sum_dtype=None):
+    """
+    Fill ``out[i, j]`` with ``sum(min(a[i], b[j]))`` by broadcasting over
+    blocks of at most ``block_size`` rows of ``a`` and as many rows of ``b``
+    as keep each temporary ``minimum`` array within about
+    ``HIK_BLOCK_BYTES``.
+    """
+    n_a, dim = a.shape
+    n_b = b.shape[0]
+    row_bytes = max(1, dim * max(a.itemsize, b.itemsize))
+    rows = HIK_BLOCK_BYTES // (n_b * row_bytes) if n_b else n_a
+    rows = max(1, min(int(block_size), rows))
+    cols = max(1, HIK_BLOCK_BYTES // (rows * row_bytes))
+    for i in xrange(0, n_a, rows):
+        for j in xrange(0, n_b, cols):
+            out[i:i+rows, j:j+cols] = \
+                np.minimum(a[i:i+rows, np.newaxis, :],
+                           b[np.newaxis, j:j+cols, :]).sum(axis=2,
+                                                           dtype=sum_dtype)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True,
+                locals={'s': numba.float64})
+    def _hik_matrix_numba(a, b, out, tile_a, tile_b):
+        """
+        Fill ``out[i, j]`` with the histogram intersection distance between
+        ``a[i]`` and ``b[j]``. The output is computed in ``tile_a x tile_b``
+        tiles, which are distributed across threads.
+        """
+        n_a = a.shape[0]
+        n_b = b.shape[0]
+        dim = a.shape[1]
+        tiles_b = (n_b + tile_b - 1) // tile_b
+        tiles = ((n_a + tile_a - 1) // tile_a) * tiles_b
+        for t in numba.prange(tiles):
+            i0 = (t // tiles_b) * tile_a
+            j0 = (t % tiles_b) * tile_b
+            for i in range(i0, min(i0 + tile_a, n_a)):
+                for j in range(j0, min(j0 + tile_b, n_b)):
+                    s = 0.
+                    for k in range(dim):
+                        s += min(a[i, k], b[j, k])
+                    out[i, j] = 1. - s
+else:
+    _hik_matrix_numba = None
+
+
+def histogram_intersection_distance_kernel(m, block_size=64):
+    """
+    Compute the symmetric histogram intersection distance kernel between the
+    rows of ``m``.
+
+    The result is the same as ``histogram_intersection_distance_matrix(m, m)``
+    but, since the kernel is symmetric, only the strict upper triangle is
+    computed and then mirrored into the lower triangle, halving the work. The
+    diagonal is ``1 - m.sum(1)``, as ``min(x, x) == x``, which is only zero
+    for L1-normalized histograms.
+
+    When numba is available, a parallel JIT kernel walks the upper triangle
+    in square cache tiles, sized as in
+    ``histogram_intersection_distance_matrix``, and mirrors each one.
+    Otherwise each block of ``block_size`` rows is compared against itself
+    and all following rows with ``histogram_intersection_distance_matrix``,
+    so only the diagonal blocks are computed in full.
+
+    :param m: Matrix of histograms.
+    :type m: numpy.core.multiarray.ndarray
+
+    :param block_size: Number of rows to process per pass when numba is not
+        available.
+    :type block_size: int
+
+    :return: Symmetric matrix of distances of shape ``(len(m), len(m))``.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    m = np.atleast_2d(m)
+    n = m.shape[0]
+    k = np.empty((n, n), dtype=np.result_type(m.dtype, np.float32))
+    if _hik_kernel_numba is not None:
+        # Square tiles whose rows fit in a cache tile together
+        row_bytes = max(1, m.shape[1] * m.itemsize)
+        _hik_kernel_numba(m, k, max(1, HIK_TILE_BYTES // (2 * row_bytes)))
+        return k
+    block_size = max(1, int(block_size))
+    for i in xrange(0, n, block_size):
+        j = min(i + block_size, n)
+        # Diagonal block and everything to its right, mirrored below it
+        k[i:j, i:] = histogram_intersection_distance_matrix(m[i:j], m[i:])
+        k[j:, i:j] = k[i:j, j:].T
+    return k
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True,
+                locals={'s': numba.float64})
+    def _hik_kernel_numba(m, out, tile):
+        """
+        Fill the symmetric ``out`` with the histogram intersection distances
+        between rows of ``m``, computing each ``i <= j`` element once. The
+        upper triangle is walked in ``tile x tile`` tiles, which are
+        distributed across threads and mirrored into the lower triangle.
+        """
+        n = m.shape[0]
+        dim = m.shape[1]
+        tiles = (n + tile - 1) // tile
+        # Tile coordinates of the upper triangle, in row-major order. Tiles
+        # are all equally sized except the half-filled diagonal ones, so an
+        # even split of this sequence balances the threads.
+        num_pairs = tiles * (tiles + 1) // 2
+        pair_i = np.empty(num_pairs, np.intp)
+        pair_j = np.empty(num_pairs, np.intp)
+        p = 0
+        for ti in range(tiles):
+            for tj in range(ti, tiles):
+                pair_i[p] = ti
+                pair_j[p] = tj
+                p += 1
+        for t in numba.prange(num_pairs):
+            i0 = pair_i[t] * tile
+            j0 = pair_j[t] * tile
+            for i in range(i0, min(i0 + tile, n)):
+                for j in range(max(j0, i), min(j0 + tile, n)):
+                    s = 0.
+                    for k in range(dim):
+                        s += min(m[i, k], m[j, k])
+                    out[i, j] = 1. - s
+                    out[j, i] = 1. - s
+else:
+    _hik_kernel_numba = None
+
+
+def quantize_histograms_uint8(m, scale=None):
+    """
+    Quantize non-negative histogram(s) ``m`` to unsigned bytes, as
+    ``round(m * scale)`` clipped to ``[0, 255]``.
+
+    A single scale is used for all histograms so that the minimum of two
+    quantized histograms is the quantized minimum of the originals, which a
+    per-histogram scale would not preserve. When not given, the scale maps the
+    largest value in ``m`` to 255. Histograms compared against ones quantized
+    before should reuse that scale.
+
+    :param m: Histogram or matrix of histograms.
+    :type m: numpy.core.multiarray.ndarray
+
+    :param scale: Optional quantization scale factor.
+    :type scale: None | float
+
+    :return: The uint8 quantized histograms and the scale used.
+    :rtype: (numpy.core.multiarray.ndarray, float)
+    """
+    if scale is None:
+        m_max = float(m.max()) if m.size else 0.
+        scale = 255. / m_max if m_max > 0 else 1.
+    q = np.multiply(m, scale, dtype=np.float32)
+    np.rint(q, out=q)
+    np.clip(q, 0, 255, out=q)
+    return q.astype(np.uint8), scale
+
+
+def histogram_intersection_distance_matrix_uint8(a, b, scale, block_size=64):
+    """
+    Compute the pair-wise histogram intersection distance matrix between the
+    rows of uint8 quantized histogram matrices ``a`` and ``b``, as returned by
+    ``quantize_histograms_uint8`` with the same ``scale``.
+
+    The result approximates ``histogram_intersection_distance_matrix`` on the
+    original histograms, while reading a quarter of the memory of single
+    precision inputs. If the optional ``_hik_simd`` C extension was built, its
+    AVX2 kernel is used. Otherwise a broadcast ``minimum``/``sum`` expression
+    is evaluated over blocks of at most ``block_size`` rows of ``a``, bounded
+    in memory as for ``histogram_intersection_distance_matrix``.
+
+    :param a: Quantized histogram or matrix of histograms ``a``
+    :type a: numpy.core.multiarray.ndarray
+
+    :param b: Quantized histogram or matrix of histograms ``b``
+    :type b: numpy.core.multiarray.ndarray
+
+    :param scale: Scale factor both inputs were quantized with.
+    :type scale: float
+
+    :param block_size: Maximum number of rows of ``a`` to process per
+        broadcast pass when the C extension is not available.
+    :type block_size: int
+
+    :return: Single precision matrix of distances of shape
+        ``(len(a), len(b))``.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    a = np.atleast_2d(a)
+    b = np.atleast_2d(b)
+    if a.dtype != np.uint8 or b.dtype != np.uint8:
+        raise ValueError("Input histograms must be uint8 quantized")
+    if a.shape[1] != b.shape[1]:
+        raise ValueError("Input histograms must be of the same dimensionality "
+                         "(%d != %d)" % (a.shape[1], b.shape[1]))
+    k = np.empty((a.shape[0], b.shape[0]), dtype=np.float32)
+    if _hik_matrix_u8_simd is not None:
+        _hik_matrix_u8_simd(np.ascontiguousarray(a), np.ascontiguousarray(b),
+                            k, scale)
+        return k
+    _hik_sums_blocked(a, b, k, block_size, np.uint32)
+    k *= -1. / scale
+    k += 1.
+    return k
+
+
+def histogram_intersection_distance_matrix_cuda(a, b, block_dim=(16, 16)):
+    """
+    Compute the pair-wise histogram intersection distance matrix between the
+    rows of ``a`` and the rows of ``b`` on a CUDA device (via numba).
+
+    The result is the same as ``histogram_intersection_distance_matrix``. One
+    device thread computes each output element. Either input may already be a
+    numba CUDA device array, in which case it is not transferred again, e.g.
+    when ``b`` is a large matrix that is compared against repeatedly.
+
+    :raises RuntimeError: numba CUDA support is not available.
+
+    :param a: Matrix of histograms ``a``
+    :type a: numpy.core.multiarray.ndarray
+
+    :param b: Matrix of histograms ``b``
+    :type b: numpy.core.multiarray.ndarray
+
+    :param block_dim: CUDA thread block dimensions.
+    :type block_dim: (int, int)
+
+    :return: Matrix of distances of shape ``(len(a), len(b))``.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    if not cuda_available():
+        raise RuntimeError("numba CUDA support is not available")
+    if a.ndim != 2 or b.ndim != 2 or a.shape[1] != b.shape[1]:
+        raise ValueError("Inputs must be matrices of the same dimensionality")
+    if isinstance(a, np.ndarray):
+        a = cuda.to_device(np.ascontiguousarray(a))
+    if isinstance(b, np.ndarray):
+        b = cuda.to_device(np.ascontiguousarray(b))
+    d_k = cuda.device_array((a.shape[0], b.shape[0]),
+                            dtype=np.result_type(a.dtype, b.dtype, np.float32))
+    grid_dim = ((a.shape[0] + block_dim[0] - 1) // block_dim[0],
+                (b.shape[0] + block_dim[1] - 1) // block_dim[1])
+    _hik_matrix_cuda[grid_dim, block_dim](a, b, d_k)
+    return d_k.copy_to_host()
+
+
+def simd_uint8_available():
+    """
+    :return: If the optional ``_hik_simd`` C extension, providing the SIMD
+        uint8 histogram intersection kernel, was built.
+    :rtype: bool
+    """
+    return _hik_matrix_u8_simd is not None
+
+
+def cuda_available():
+    """
+    :return: If numba CUDA support and a CUDA device are available.
+    :rtype: bool
+    """
+    return cuda is not None and cuda.is_available()
+
+
+if cuda is not None:
+    @cuda.jit
+    def _hik_matrix_cuda(a, b, out):
+        """
+        Device kernel setting ``out[i, j]`` to the histogram intersection
+        distance between ``a[i]`` and ``b[j]`` for thread grid position
+        ``(i, j)``.
+        """
+        i, j = cuda.grid(2)
+        if i < a.shape[0] and j < b.shape[0]:
+            # Single precision unless the inputs are double precision, since
+            # double throughput is low on most consumer devices.
+            s = numba.float32(0.)
+            for k in range(a.shape[1]):
+                s += min(a[i, k], b[j, k])
+            out[i, j] = 1. - s
+else:
+    _hik_matrix_cuda = None
+
+
 def euclidean_distance(i, j):
     """
     Compute euclidean distance between two N-dimensional point vectors.
@@ -2,6 +2,7 @@
 import os
 import re
 import setuptools
+from setuptools.command.build_ext import build_ext
 
 
 PYTHON_SRC = 'python'
@@ -81,6 +82,27 @@ def list_directory_files(dirpath, exclude_dirs=(), exclude_files=()):
     return file_paths
 
 
+class OptionalBuildExt (build_ext):
+    """
+    ``build_ext`` command that does not fail the install when an extension
+    cannot be built. All of our extensions are optional accelerations that
+    have pure python/numpy fallbacks.
+    """
+
+    def run(self):
+        try:
+            build_ext.run(self)
+        except Exception, ex:
+            print "WARNING: Skipping building of C extensions:", ex
+
+    def build_extension(self, ext):
+        try:
+            build_ext.build_extension(self, ext)
+        except Exception, ex:
+            print "WARNING: Failed to build optional extension %s: %s" \
+                  % (ext.name, ex)
+
+
 ################################################################################
 
 
@@ -118,6 +140,18 @@ setuptools.setup(
     package_data={
         'smqtk': find_package_datafiles(os.path.join(PYTHON_SRC, 'smqtk'))
     },
+    ext_modules=[
+        # SIMD histogram intersection kernel. Instruction set is selected at
+        # runtime, so no architecture flags are given here.
+        setuptools.Extension(
+            'smqtk.utils._hik_simd',
+            sources=[os.path.join(PYTHON_SRC, 'smqtk/utils/_hik_simd.c')],
+            extra_compile_args=['-O3'],
+        ),
+    ],
+    cmdclass={
+        'build_ext': OptionalBuildExt,
+    },
 
     setup_requires=[
         'setuptools',
@@ -153,6 +187,9 @@ setuptools.setup(
         'flann': [
             'pyflann>=1.8.4',
         ],
+        'numba': [
+            'numba>=0.34',
+        ],
         'postgres': [
             'psycopg2',
         ],